@@ -1,9 +1,27 @@
 import os
+import re
+import copy
+import contextlib
+import queue
+import asyncio
 import shutil
+import functools
+import subprocess
+import threading
+import time
+import mimetypes
+import unicodedata
+import orjson
 import yt_dlp
 import urllib.parse
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 import logging
+from collections import OrderedDict
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from diskcache import Cache
+from werkzeug.security import safe_join
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -13,77 +31,225 @@ logger = logging.getLogger('instube')
 # ----------------------------
 # Flask setup
 # ----------------------------
+class OrjsonProvider(DefaultJSONProvider):
+    """Serve jsonify/get_json through orjson; Flask's own default() still handles dates etc."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, template_folder='templates', static_folder='static')
+app.json = OrjsonProvider(app)
 
 # Centralized paths
 DOWNLOAD_FOLDER = os.path.join(app.static_folder, 'downloads')
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
+CACHE_FOLDER = os.path.join(app.root_path, '.cache')
+
+# Files recently known to exist, so repeated/ranged requests for the same
+# download skip the existence stat for a few seconds
+_existing_downloads = TTLCache(maxsize=1024, ttl=5)
+_existing_downloads_lock = threading.Lock()
+
+# Hand finished files to the reverse proxy so it can sendfile(2) them instead of
+# streaming through a Flask worker. For nginx, set X_ACCEL_REDIRECT_PREFIX=/_protected/
+# together with:  location /_protected/ { internal; alias /path/to/static/downloads/; }
+# For Apache with mod_xsendfile, set USE_X_SENDFILE=1.
+X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
+
+# Metadata lookups are cached on disk (shared across workers) with a small
+# in-process LRU in front of it for repeat hits on the same URL.
+INFO_CACHE_TTL = 3600
+INFO_MEMORY_CACHE_SIZE = 256
+_info_cache = Cache(os.path.join(CACHE_FOLDER, 'info'))
+_info_memory_cache = OrderedDict()
+_info_memory_lock = threading.Lock()
+
+# Raw yt-dlp info dicts from /api/info, kept briefly so the follow-up download
+# can skip a second extraction (stream URLs expire, hence the short TTL).
+RAW_INFO_CACHE_TTL = 600
+_raw_info_cache = TTLCache(maxsize=256, ttl=RAW_INFO_CACHE_TTL)
+_raw_info_lock = threading.Lock()
+
+# /api/download runs yt-dlp on this pool; its size caps how many single downloads run at
+# once per process. The request thread waits for the result, so requests beyond the cap
+# queue while holding their gunicorn thread: keep it at or below GUNICORN_THREADS.
+# Batches use their own pool (below) so a large batch can't starve single downloads.
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", "4"))
+_download_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS,
+                                        thread_name_prefix="yt-dlp")
+
+# Pooled YoutubeDL instances, keyed by their options (see _pooled_ydl). With the
+# requests/urllib3 handler from yt-dlp[default], each instance also keeps its
+# keep-alive connection pool, so TLS handshakes are reused across downloads.
+YTDL_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'yt-dlp')
+_ydl_pools = {}
+_ydl_pools_lock = threading.Lock()
+
+# Per-download network tuning passed to yt-dlp
+CONCURRENT_FRAGMENT_DOWNLOADS = int(os.environ.get("CONCURRENT_FRAGMENT_DOWNLOADS", "8"))
+HTTP_CHUNK_SIZE = 10 << 20  # 10 MiB
+DOWNLOAD_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+# Opt-in: merge split video+audio formats while downloading instead of via intermediate
+# files. ffmpeg then fetches the streams itself, without yt-dlp's retries or chunking,
+# so it is skipped for formats that need extractor-specific downloader options
+# (e.g. YouTube's chunked requests that avoid throttling).
+FFMPEG_DIRECT_MERGE = os.environ.get("FFMPEG_DIRECT_MERGE", "0") == "1"
+
+# ffmpeg merges/transcodes for batches run here, overlapping with the next download
+_ffmpeg_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 2,
+                                      thread_name_prefix="ffmpeg")
+
+# Batch downloads fan out per URL but keep only a few in flight to avoid rate limits;
+# the pool caps them across all batches running in this process
+BATCH_CONCURRENCY = 4
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY,
+                                     thread_name_prefix="yt-dlp-batch")
+MAX_BATCH_URLS = 25
 
 
 # ----------------------------
 # Helper: sanitize and download
 # ----------------------------
+# \w matches str.isalnum() characters plus "_", so this keeps Unicode titles intact
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^\w .-]+")
+_REPEATED_SPACES = re.compile(r" {2,}")
+
+
 def sanitize_filename(name: str) -> str:
     """Remove problematic characters from filenames."""
     # Keep only alphanumeric, spaces, and some safe chars
-    safe = "".join(c for c in name if c.isalnum() or c in (" ", ".", "_", "-")).rstrip()
+    safe = _UNSAFE_FILENAME_CHARS.sub("", name)
     # Replace multiple spaces with single space
-    safe = ' '.join(safe.split())
+    safe = _REPEATED_SPACES.sub(" ", safe).strip(" ")
     # Ensure the filename isn't too long for some filesystems
     if len(safe) > 200:
         safe = safe[:197] + "..."
     return safe
 
 
+# PATH doesn't change while the process runs, so look the binaries up once
+_FFMPEG_PATH = shutil.which("ffmpeg")
+_FFPROBE_PATH = shutil.which("ffprobe")
+
+
+@functools.lru_cache(maxsize=1)
 def _has_ffmpeg() -> bool:
     """Check whether ffmpeg is available on PATH."""
-    ffmpeg = shutil.which("ffmpeg")
-    ffprobe = shutil.which("ffprobe")
-    if ffmpeg and ffprobe:
-        logger.info(f"FFmpeg detected at: {ffmpeg}")
+    if _FFMPEG_PATH and _FFPROBE_PATH:
+        logger.info(f"FFmpeg detected at: {_FFMPEG_PATH}")
         return True
     logger.warning("FFmpeg not detected; falling back to progressive formats (audio codec may not be MP3).")
     return False
 
-def download_with_yt_dlp(url: str, format_type: str = None, media_type: str = None) -> dict:
+def _remember_download(filename: str) -> None:
+    """Mark a file in DOWNLOAD_FOLDER as existing for download_file's short-lived check."""
+    with _existing_downloads_lock:
+        _existing_downloads[filename] = True
+
+
+@contextlib.contextmanager
+def _pooled_ydl(ydl_opts: dict):
     """
-    Download a video from the given URL and return metadata.
-    Supports multiple formats with fallback.
+    Borrow a YoutubeDL configured with ydl_opts, yielding (ydl, output).
+    Instances are reused across requests so extractor state and yt-dlp's caches
+    (player JS, signatures) are kept; only "format" may differ between borrowers.
+    output["path"] holds the final file path reported by yt-dlp's hooks.
     """
-    use_ffmpeg = _has_ffmpeg()
-    
+    opts = dict(ydl_opts, cachedir=YTDL_CACHE_FOLDER)
+    format_str = opts.pop("format", None)
+    key = repr(sorted(opts.items()))
+    with _ydl_pools_lock:
+        pool = _ydl_pools.setdefault(key, queue.SimpleQueue())
+
+    try:
+        ydl, output = pool.get_nowait()
+    except queue.Empty:
+        # The post-processor hooks run last and see any extension change from merging
+        output = {}
+
+        def _record_output_path(d):
+            if d.get("status") == "finished":
+                output["path"] = (d.get("info_dict") or {}).get("filepath") or d.get("filename")
+
+        ydl = yt_dlp.YoutubeDL(dict(opts, format=format_str,
+                                    progress_hooks=[_record_output_path],
+                                    postprocessor_hooks=[_record_output_path]))
+    if ydl.params.get("format") != format_str:
+        ydl.params["format"] = format_str
+        ydl.format_selector = ydl.build_format_selector(format_str) if format_str else None
+
+    output.clear()
+    try:
+        yield ydl, output
+    finally:
+        pool.put((ydl, output))
+
+
+def _download_with_info(ydl: yt_dlp.YoutubeDL, url: str, download):
+    """
+    Return download(info) for url's format-selected info dict. Info cached by /api/info
+    is tried first; if downloading from it fails (e.g. its stream URLs expired), the
+    entry is dropped and the URL is extracted and downloaded again.
+    """
+    with _raw_info_lock:
+        cached = _raw_info_cache.get(url)
+    if cached is not None:
+        logger.info(f"Reusing extracted info for download: {url}")
+        try:
+            return download(ydl.process_ie_result(copy.deepcopy(cached), download=False))
+        except yt_dlp.utils.DownloadError as e:
+            logger.warning(f"Download from cached info failed, re-extracting: {str(e)}")
+            with _raw_info_lock:
+                _raw_info_cache.pop(url, None)
+    return download(ydl.extract_info(url, download=False))
+
+
+def _without_selection(info: dict) -> dict:
+    """Shallow copy of a format-selected info dict that yt-dlp can select formats on again."""
+    return {k: v for k, v in info.items() if k not in ("requested_formats", "requested_downloads")}
+
+
+# yt-dlp format strings keyed by (media kind, user format choice, ffmpeg available)
+_FORMAT_TABLE = {}
+for _use_ffmpeg in (True, False):
+    # Audio-only downloads
+    _FORMAT_TABLE[("audio", "320kbps", _use_ffmpeg)] = "bestaudio[ext=mp3]/bestaudio/best"
+    _FORMAT_TABLE[("audio", "128kbps", _use_ffmpeg)] = "worstaudio[ext=mp3]/worstaudio/best"
+for _height in (1080, 720, 480):
+    # Video downloads with specific resolution; without FFmpeg only progressive formats work
+    _FORMAT_TABLE[("video", f"{_height}p", True)] = (
+        f"bestvideo[height<={_height}][ext=mp4][vcodec^=avc1]+bestaudio"
+        f"/best[height<={_height}][ext=mp4]/best[height<={_height}]"
+    )
+    _FORMAT_TABLE[("video", f"{_height}p", False)] = (
+        f"best[height<={_height}][ext=mp4][acodec!=none]/best[height<={_height}][acodec!=none]"
+    )
+del _use_ffmpeg, _height
+
+# Fallbacks for unknown/missing choices, keyed by (media kind, ffmpeg available)
+_DEFAULT_FORMATS = {
+    ("audio", True): "bestaudio[ext=mp3]/bestaudio/best",
+    ("audio", False): "bestaudio[ext=mp3]/bestaudio/best",
+    # Default: best quality
+    ("video", True): "bestvideo+bestaudio/best",
+    ("video", False): "best[acodec!=none]/best",
+}
+
+
+def _build_ydl_opts(format_type: str = None, media_type: str = None, use_ffmpeg: bool = False) -> dict:
+    """Build the yt-dlp options for the user's format/media selection."""
     # Determine format string based on user selection
-    if media_type == "audio":
-        # Audio-only downloads
-        if format_type == "320kbps":
-            format_str = "bestaudio[ext=mp3]/bestaudio/best"
-        elif format_type == "128kbps":
-            format_str = "worstaudio[ext=mp3]/worstaudio/best"
-        else:
-            format_str = "bestaudio[ext=mp3]/bestaudio/best"
-    else:
-        # Video downloads with specific resolution
-        if format_type == "1080p":
-            if use_ffmpeg:
-                format_str = "bestvideo[height<=1080][ext=mp4][vcodec^=avc1]+bestaudio/best[height<=1080][ext=mp4]/best[height<=1080]"
-            else:
-                format_str = "best[height<=1080][ext=mp4][acodec!=none]/best[height<=1080][acodec!=none]"
-        elif format_type == "720p":
-            if use_ffmpeg:
-                format_str = "bestvideo[height<=720][ext=mp4][vcodec^=avc1]+bestaudio/best[height<=720][ext=mp4]/best[height<=720]"
-            else:
-                format_str = "best[height<=720][ext=mp4][acodec!=none]/best[height<=720][acodec!=none]"
-        elif format_type == "480p":
-            if use_ffmpeg:
-                format_str = "bestvideo[height<=480][ext=mp4][vcodec^=avc1]+bestaudio/best[height<=480][ext=mp4]/best[height<=480]"
-            else:
-                format_str = "best[height<=480][ext=mp4][acodec!=none]/best[height<=480][acodec!=none]"
-        else:
-            # Default: best quality
-            if use_ffmpeg:
-                format_str = "bestvideo+bestaudio/best"
-            else:
-                format_str = "best[acodec!=none]/best"
+    kind = "audio" if media_type == "audio" else "video"
+    format_str = _FORMAT_TABLE.get((kind, format_type, use_ffmpeg)) or _DEFAULT_FORMATS[(kind, use_ffmpeg)]
 
     # Set output template based on media type
     if media_type == "audio":
@@ -111,24 +277,21 @@ def download_with_yt_dlp(url: str, format_type: str = None, media_type: str = No
         # Skip unnecessary processing
         "skip_unavailable_fragments": True,
         "keep_fragments": False,
+        # Parallel HLS/DASH fragments, and ranged requests for progressive files
+        "concurrent_fragment_downloads": CONCURRENT_FRAGMENT_DOWNLOADS,
+        "http_chunk_size": HTTP_CHUNK_SIZE,
+        # Start with large read/write blocks instead of ramping up from 1 KiB
+        "buffersize": DOWNLOAD_BUFFER_SIZE,
     }
 
     if use_ffmpeg:
-        if media_type == "audio":
-            # For audio-only downloads, ensure MP3 output
-            ydl_opts.update(
-                {
-                    "merge_output_format": "mp3",
-                    "postprocessor_args": [
-                        "-c:a",
-                        "libmp3lame",
-                        "-b:a",
-                        "320k" if format_type == "320kbps" else "128k",
-                    ],
-                }
-            )
-        else:
+        # Point yt-dlp at the binaries found above so it skips its own PATH search
+        ffmpeg_dir = os.path.dirname(_FFMPEG_PATH)
+        if ffmpeg_dir == os.path.dirname(_FFPROBE_PATH):
+            ydl_opts["ffmpeg_location"] = ffmpeg_dir
+        if media_type != "audio":
             # For video downloads, merge best video+audio into MKV
+            # (audio is converted to MP3 by finalize_streams() instead)
             ydl_opts.update({
                 "merge_output_format": "mkv"
             })
@@ -137,46 +300,49 @@ def download_with_yt_dlp(url: str, format_type: str = None, media_type: str = No
         # Note: audio codec will likely be AAC/Opus, not MP3.
         ydl_opts.pop("prefer_ffmpeg", None)
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-        filename = ydl.prepare_filename(info)
-        
-        # Get actual downloaded filename (may differ from prepared filename)
-        # This handles cases where yt-dlp renamed the file due to conflicts
-        actual_filename = os.path.basename(filename)
-        
-        # Check if the file exists with the expected name
-        expected_path = os.path.join(DOWNLOAD_FOLDER, actual_filename)
-        if not os.path.exists(expected_path):
-            logger.warning(f"Expected file not found: {expected_path}")
-            # Try looking for any matching file with a similar name
-            if media_type == "audio":
-                # Look for audio files
-                audio_files = [f for f in os.listdir(DOWNLOAD_FOLDER) if f.endswith((".mp3", ".m4a", ".ogg"))]
-                if audio_files:
-                    # Sort by creation time, newest first
-                    audio_files.sort(key=lambda x: os.path.getctime(os.path.join(DOWNLOAD_FOLDER, x)), reverse=True)
-                    actual_filename = audio_files[0]
-                    logger.info(f"Using alternative audio file found: {actual_filename}")
-            else:
-                # Look for video files
-                video_files = [f for f in os.listdir(DOWNLOAD_FOLDER) if f.endswith((".mp4", ".webm", ".mkv"))]
-                if video_files:
-                    # Sort by creation time, newest first
-                    video_files.sort(key=lambda x: os.path.getctime(os.path.join(DOWNLOAD_FOLDER, x)), reverse=True)
-                    actual_filename = video_files[0]
-                    logger.info(f"Using alternative video file found: {actual_filename}")
-        else:
+    return ydl_opts
+
+
+def download_with_yt_dlp(url: str, format_type: str = None, media_type: str = None,
+                         allow_m4a: bool = False) -> dict:
+    """
+    Download a video from the given URL and return metadata.
+    Supports multiple formats with fallback.
+    """
+    use_ffmpeg = _has_ffmpeg()
+    if use_ffmpeg and media_type == "audio":
+        # Same MP3 conversion (and opt-in M4A stream copy) as batch audio downloads
+        return finalize_streams(download_streams(url, format_type, media_type, allow_m4a))
+    ydl_opts = _build_ydl_opts(format_type, media_type, use_ffmpeg)
+
+    with _pooled_ydl(ydl_opts) as (ydl, output):
+
+        def _download(info):
+            requested = info.get("requested_formats")
+            try:
+                if (use_ffmpeg and FFMPEG_DIRECT_MERGE and requested
+                        and not any(f.get("downloader_options") for f in requested)):
+                    # Let ffmpeg read the separate video/audio streams over HTTP and mux
+                    # them directly, so the merged file is the only thing written to disk
+                    ydl.params["external_downloader"] = {"http": "ffmpeg"}
+                return ydl.process_ie_result(_without_selection(info), download=True)
+            finally:
+                # The instance goes back to the pool; don't leak the per-download override
+                ydl.params.pop("external_downloader", None)
+
+        info = _download_with_info(ydl, url, _download)
+        filepath = output.get("path") or ydl.prepare_filename(info)
+        actual_filename = os.path.basename(filepath)
+
+        if os.path.exists(filepath):
             logger.info(f"Downloaded file found: {actual_filename}")
-        
-        # Make sure we have a clean, properly encoded URL
-        safe_url = urllib.parse.quote(actual_filename)
-        download_url = f"/static/downloads/{safe_url}"
+            _remember_download(actual_filename)
+        else:
+            logger.warning(f"Expected file not found: {filepath}")
 
     result = {
         "title": info.get("title"),
         "filename": actual_filename,
-        "download_url": download_url,
         "ext": info.get("ext"),
         "duration": info.get("duration"),
         "uploader": info.get("uploader"),
@@ -196,6 +362,125 @@ def download_with_yt_dlp(url: str, format_type: str = None, media_type: str = No
     return result
 
 
+def download_streams(url: str, format_type: str = None, media_type: str = None,
+                     allow_m4a: bool = False) -> dict:
+    """
+    Download the selected streams as separate files without running ffmpeg on them.
+    Returns a job for finalize_streams(), so merging/transcoding can overlap the next download.
+    With allow_m4a, finalize_streams() may keep low-bitrate AAC audio as M4A instead of MP3.
+    """
+    ydl_opts = _build_ydl_opts(format_type, media_type, use_ffmpeg=True)
+    # finalize_streams() remuxes/encodes every stream anyway, so skip yt-dlp's container
+    # fixups (m4a DASH, HLS) that would otherwise run ffmpeg inside the download slot
+    stream_opts = dict(
+        ydl_opts,
+        outtmpl=os.path.join(DOWNLOAD_FOLDER, "%(title)s.f%(format_id)s.%(ext)s"),
+        fixup="never",
+    )
+
+    def _download(info):
+        # Fetch each selected format on its own so yt-dlp never queues a merge
+        base_info = _without_selection(info)
+        paths = []
+        for f in info.get("requested_formats") or [info]:
+            with _pooled_ydl(dict(stream_opts, format=f["format_id"])) as (ydl, _):
+                done = ydl.process_ie_result(dict(base_info), download=True)
+            paths.append(done["requested_downloads"][0]["filepath"])
+        return info, paths
+
+    with _pooled_ydl(ydl_opts) as (ydl, _):
+        info, paths = _download_with_info(ydl, url, _download)
+        output_base = os.path.splitext(ydl.prepare_filename(info))[0]
+
+    return {
+        "info": {k: info.get(k) for k in ("title", "duration", "uploader", "acodec", "abr")},
+        "paths": paths,
+        "output_base": output_base,
+        "format_type": format_type,
+        "media_type": media_type,
+        "allow_m4a": allow_m4a,
+    }
+
+
+def finalize_streams(job: dict) -> dict:
+    """Merge (video) or convert to MP3 (audio) the files from download_streams()."""
+    paths = job["paths"]
+    info = job["info"]
+    warning = None
+    # Keep ffmpeg off the server's tty and only collect errors, not progress output
+    ffmpeg = [_FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-y"]
+    if job["media_type"] == "audio":
+        acodec = (info.get("acodec") or "").lower()
+        abr = info.get("abr") or 0
+        target_kbps = 320 if job["format_type"] == "320kbps" else 128
+        if acodec.startswith("mp3"):
+            # Already MP3: remux only, no encode pass
+            output = job["output_base"] + ".mp3"
+            codec_args = ["-c:a", "copy"]
+            audio_note = "mp3"
+        elif (job["allow_m4a"] and acodec.startswith(("mp4a", "aac"))
+                and abr and abr <= target_kbps * 1.05):
+            # Re-encoding AAC to an equal/higher MP3 bitrate only loses quality, so the
+            # caller may opt in to keeping the AAC stream (5% slack: YouTube's 128k AAC
+            # reports ~130kbps)
+            output = job["output_base"] + ".m4a"
+            codec_args = ["-c:a", "copy"]
+            audio_note = "m4a (aac stream copy)"
+            warning = (
+                f"Source audio is {round(abr)}kbps AAC; saved as M4A without re-encoding "
+                f"since MP3 at {target_kbps}kbps would not improve quality."
+            )
+        else:
+            output = job["output_base"] + ".mp3"
+            codec_args = ["-c:a", "libmp3lame", "-b:a", f"{target_kbps}k"]
+            audio_note = "mp3"
+        cmd = [*ffmpeg, "-i", paths[0], "-vn", *codec_args, output]
+    elif len(paths) > 1:
+        output = job["output_base"] + ".mkv"
+        cmd = list(ffmpeg)
+        for path in paths:
+            cmd += ["-i", path]
+        for i in range(len(paths)):
+            cmd += ["-map", str(i)]
+        cmd += ["-c", "copy", output]
+        audio_note = "merged mkv (bestvideo+bestaudio)"
+    else:
+        # A single progressive stream needs no ffmpeg pass
+        output = job["output_base"] + os.path.splitext(paths[0])[1]
+        cmd = None
+        audio_note = "progressive (no merge)"
+
+    try:
+        if cmd:
+            subprocess.run(cmd, check=True, capture_output=True, stdin=subprocess.DEVNULL)
+        else:
+            os.replace(paths[0], output)
+    except subprocess.CalledProcessError as e:
+        lines = e.stderr.decode(errors="replace").strip().splitlines()
+        reason = lines[-1] if lines else f"exit status {e.returncode}"
+        raise RuntimeError(f"ffmpeg failed: {reason}") from e
+    finally:
+        # Don't leave the intermediate streams in the public downloads folder
+        for path in paths:
+            if path != output and os.path.exists(path):
+                os.remove(path)
+
+    filename = os.path.basename(output)
+    logger.info(f"Post-processed file ready: {filename}")
+    _remember_download(filename)
+    result = {
+        "title": info.get("title"),
+        "filename": filename,
+        "ext": os.path.splitext(filename)[1].lstrip("."),
+        "duration": info.get("duration"),
+        "uploader": info.get("uploader"),
+        "audio_note": audio_note,
+    }
+    if warning:
+        result["warning"] = warning
+    return result
+
+
 def extract_info_no_download(url: str) -> dict:
     """Extract video metadata and try to provide a preview URL without downloading."""
     ydl_opts = {
@@ -206,12 +491,16 @@ def extract_info_no_download(url: str) -> dict:
     }
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with _pooled_ydl(ydl_opts) as (ydl, _):
             info = ydl.extract_info(url, download=False)
     except Exception as e:
         logger.error(f"Error extracting info: {str(e)}")
         raise
 
+    # Strip per-selection state so the download can re-run format selection on it
+    with _raw_info_lock:
+        _raw_info_cache[url] = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+
     # Determine preview URL and best available quality/format
     preview_url = None
     best_height = None
@@ -239,61 +528,43 @@ def extract_info_no_download(url: str) -> dict:
                         logger.info(f"Found video-only preview format: {f.get('format_id')}")
                         break
         
-        # Fallback: scan all formats for a likely progressive mp4/webm
-        if not preview_url:
-            all_formats = info.get("formats") or []
-            
-            # First try formats with both video and audio
-            for f in all_formats:
-                if not f:
-                    continue
-                if (f.get("vcodec") != "none" and f.get("acodec") != "none" and
-                    f.get("url")):
-                    ext = (f.get("ext") or "").lower()
-                    if ext in ("mp4", "webm"):
-                        preview_url = f.get("url")
-                        logger.info(f"Found fallback preview format: {f.get('format_id')}")
-                        break
-            
-            # Last resort: any video format
-            if not preview_url:
-                for f in all_formats:
-                    if not f:
-                        continue
-                    if f.get("vcodec") == "none":
-                        continue
-                    if f.get("url"):
-                        preview_url = f.get("url")
-                        logger.info(f"Found last-resort preview format: {f.get('format_id')}")
-                        break
-
-    # Independently compute highest available height across ALL video formats (even video-only)
-    try:
-        all_formats_full = info.get("formats") or []
+        # Single pass over all formats: remember the first progressive mp4/webm and
+        # the first video format as preview fallbacks, and track the highest
+        # available height across ALL video formats (even video-only)
+        first_progressive = None
+        first_video = None
         max_height = 0
-        height_to_exts = {}
-        for f in all_formats_full:
-            if not f:
+        exts_at_max = set()
+        for f in info.get("formats") or []:
+            if not f or f.get("vcodec") == "none":
                 continue
-            if f.get("vcodec") == "none":
-                continue
-            h = f.get("height") or 0
+            ext = (f.get("ext") or "").lower()
+            if f.get("url"):
+                if first_progressive is None and f.get("acodec") != "none" and ext in ("mp4", "webm"):
+                    first_progressive = f
+                elif first_video is None:
+                    first_video = f
             try:
-                h = int(h)
-            except Exception:
+                h = int(f.get("height") or 0)
+            except (TypeError, ValueError):
                 h = 0
-            if h <= 0:
-                continue
-            max_height = max(max_height, h)
-            ext = (f.get("ext") or "").lower()
-            height_to_exts.setdefault(h, set()).add(ext)
+            if h > max_height:
+                max_height = h
+                exts_at_max = {ext}
+            elif h and h == max_height:
+                exts_at_max.add(ext)
+
+        if not preview_url and first_progressive:
+            preview_url = first_progressive.get("url")
+            logger.info(f"Found fallback preview format: {first_progressive.get('format_id')}")
+        elif not preview_url and first_video:
+            # Last resort: any video format
+            preview_url = first_video.get("url")
+            logger.info(f"Found last-resort preview format: {first_video.get('format_id')}")
 
         if max_height > 0:
-            exts_at = height_to_exts.get(max_height, set())
-            best_ext = "mp4" if "mp4" in exts_at else (next(iter(exts_at)) if exts_at else None)
+            best_ext = "mp4" if "mp4" in exts_at_max else next(iter(exts_at_max))
             best_height = max_height
-    except Exception as _:
-        pass
 
     # Map height to user-friendly label
     def _quality_label(height):
@@ -326,6 +597,119 @@ def extract_info_no_download(url: str) -> dict:
     }
 
 
+def get_video_info(url: str) -> dict:
+    """
+    Return extract_info_no_download(url), served from the in-process LRU or the
+    disk cache when a fresh entry exists. The returned dict must not be mutated.
+    """
+    now = time.time()
+    with _info_memory_lock:
+        entry = _info_memory_cache.get(url)
+        if entry is not None and entry[0] > now:
+            _info_memory_cache.move_to_end(url)
+            return entry[1]
+
+    info, expires_at = _info_cache.get(url, expire_time=True)
+    if info is None:
+        info = extract_info_no_download(url)
+        expires_at = now + INFO_CACHE_TTL
+        _info_cache.set(url, info, expire=INFO_CACHE_TTL)
+    else:
+        logger.info(f"Info cache hit: {url}")
+
+    with _info_memory_lock:
+        _info_memory_cache[url] = (expires_at, info)
+        _info_memory_cache.move_to_end(url)
+        while len(_info_memory_cache) > INFO_MEMORY_CACHE_SIZE:
+            _info_memory_cache.popitem(last=False)
+    return info
+
+
+# ----------------------------
+# Helper: async download orchestration
+# ----------------------------
+# Browsers sometimes re-POST the same download, so remember recent quoted names
+_quote_filename = functools.lru_cache(maxsize=1024)(urllib.parse.quote)
+
+
+def _finalize_download_result(result: dict, media_type: str = None) -> dict:
+    """Attach the browser-facing download URL and audio warnings to a result."""
+    # Add Content-Disposition header suggestion to ensure browser offers download
+    result['download_url'] = f"/static/downloads/{_quote_filename(result['filename'])}?download=true"
+    if result.get("audio_note") != "mp3" and media_type == "audio":
+        # Keep a more specific warning if the download step already set one
+        result.setdefault(
+            "warning",
+            "Downloaded using progressive format. Audio codec may not be MP3 because FFmpeg was not detected.",
+        )
+    return result
+
+
+async def _download_one(url: str, format_type: str, media_type: str, allow_m4a: bool,
+                        semaphore: asyncio.Semaphore, on_done=None) -> dict:
+    """Download a single batch entry, returning its result or an error dict."""
+    loop = asyncio.get_running_loop()
+    try:
+        if _has_ffmpeg():
+            async with semaphore:
+                job = await loop.run_in_executor(
+                    _batch_executor, download_streams, url, format_type, media_type, allow_m4a
+                )
+            # The download slot is free again, so the next URL downloads while ffmpeg runs
+            result = await loop.run_in_executor(_ffmpeg_executor, finalize_streams, job)
+        else:
+            async with semaphore:
+                result = await loop.run_in_executor(
+                    _batch_executor, download_with_yt_dlp, url, format_type, media_type
+                )
+        logger.info(f"Batch download successful: {result['filename']}")
+        result = _finalize_download_result(result, media_type)
+    except Exception as e:
+        logger.error(f"Batch download failed for {url}: {str(e)}")
+        result = {"error": f"Download failed: {str(e)}"}
+    result["url"] = url
+    if on_done is not None:
+        on_done(result)
+    return result
+
+
+async def download_batch(urls: list, format_type: str = None, media_type: str = None,
+                         allow_m4a: bool = False, on_done=None) -> list:
+    """
+    Download several URLs concurrently and return per-URL results in input order.
+    Failures are reported per entry instead of cancelling the rest of the batch.
+    A URL listed more than once is downloaded once and its result repeated.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    # Duplicates would write the same stream and output files at the same time
+    tasks = {}
+    async with asyncio.TaskGroup() as tg:
+        for url in urls:
+            if url not in tasks:
+                tasks[url] = tg.create_task(
+                    _download_one(url, format_type, media_type, allow_m4a, semaphore, on_done)
+                )
+    return [tasks[url].result() for url in urls]
+
+
+def _stream_batch(urls: list, format_type: str = None, media_type: str = None, allow_m4a: bool = False):
+    """Yield Server-Sent Events as each distinct batch URL finishes."""
+    urls = list(dict.fromkeys(urls))
+    events = queue.Queue()
+    worker = threading.Thread(
+        target=lambda: asyncio.run(download_batch(urls, format_type, media_type, allow_m4a, on_done=events.put)),
+        daemon=True,
+    )
+    worker.start()
+    for completed in range(1, len(urls) + 1):
+        result = events.get()
+        result["completed"] = completed
+        result["total"] = len(urls)
+        yield f"event: result\ndata: {app.json.dumps(result)}\n\n"
+    worker.join()
+    yield f"event: done\ndata: {app.json.dumps({'total': len(urls)})}\n\n"
+
+
 # ----------------------------
 # Routes
 # ----------------------------
@@ -340,20 +724,44 @@ def download_file(filename):
     # Decode the URL-encoded filename
     decoded_filename = urllib.parse.unquote(filename)
     
-    # Create full path to the file
-    file_path = os.path.join(DOWNLOAD_FOLDER, decoded_filename)
+    # Create full path to the file (None if it would escape the downloads folder)
+    file_path = safe_join(DOWNLOAD_FOLDER, decoded_filename)
     
-    # Check if file exists
-    if not os.path.exists(file_path):
-        logger.error(f"File not found: {file_path}")
-        return "File not found", 404
+    # Check if file exists (recently confirmed files skip the stat)
+    with _existing_downloads_lock:
+        known = decoded_filename in _existing_downloads
+    if not known:
+        if file_path is None or not os.path.isfile(file_path):
+            logger.error(f"File not found: {file_path or decoded_filename}")
+            return "File not found", 404
+        _remember_download(decoded_filename)
+
+    if X_ACCEL_REDIRECT_PREFIX:
+        # nginx streams the file itself; this response only carries headers
+        response = Response(mimetype=mimetypes.guess_type(decoded_filename)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = (
+            f"{X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{urllib.parse.quote(decoded_filename)}"
+        )
+        try:
+            decoded_filename.encode("ascii")
+            names = {"filename": decoded_filename}
+        except UnicodeEncodeError:
+            # Same RFC 2231 fallback Flask's send_file uses for non-ASCII names
+            simple = unicodedata.normalize("NFKD", decoded_filename).encode("ascii", "ignore").decode("ascii")
+            names = {"filename": simple, "filename*": f"UTF-8''{urllib.parse.quote(decoded_filename, safe='')}"}
+        response.headers.set("Content-Disposition", "attachment", **names)
+        return response
         
-    # Always force download with Content-Disposition header
+    # Always force download with Content-Disposition header. conditional=True answers
+    # Range/If-Range with 206 partial content so interrupted downloads can resume, and
+    # full responses go through wsgi.file_wrapper (sendfile under gunicorn).
     return send_from_directory(
         directory=DOWNLOAD_FOLDER,
         path=decoded_filename,
         as_attachment=True,
-        download_name=decoded_filename
+        download_name=decoded_filename,
+        conditional=True,
+        etag=True,
     )
 
 
@@ -364,27 +772,49 @@ def download_video():
     url = data.get("url")
     format_type = data.get("format")  # e.g., "1080p", "720p", "320kbps"
     media_type = data.get("type")     # "video" or "audio"
+    # Opt in to keeping AAC audio as M4A when MP3 conversion wouldn't improve quality
+    allow_m4a = bool(data.get("allow_m4a"))
 
     if not url:
         return jsonify({"error": "URL is required."}), 400
 
     try:
-        result = download_with_yt_dlp(url, format_type, media_type)
+        result = _download_executor.submit(
+            download_with_yt_dlp, url, format_type, media_type, allow_m4a
+        ).result()
         logger.info(f"Download successful: {result['filename']}")
-        
-        # Add Content-Disposition header suggestion to ensure browser offers download
-        result['download_url'] = f"/static/downloads/{urllib.parse.quote(result['filename'])}?download=true"
-        if result.get("audio_note") != "mp3" and media_type == "audio":
-            result["warning"] = (
-                "Downloaded using progressive format. Audio codec may not be MP3 because FFmpeg was not detected."
-            )
-        
-        return jsonify(result)
+        return jsonify(_finalize_download_result(result, media_type))
     except Exception as e:
         logger.error(f"Download failed: {str(e)}")
         return jsonify({"error": f"Download failed: {str(e)}"}), 500
 
 
+@app.route("/api/download_batch", methods=["POST"])
+async def download_batch_video():
+    """API endpoint to download several URLs at once; set "stream" for SSE progress."""
+    data = request.get_json(force=True)
+    urls = data.get("urls")
+    format_type = data.get("format")
+    media_type = data.get("type")
+    # Opt in to keeping AAC audio as M4A when MP3 conversion wouldn't improve quality
+    allow_m4a = bool(data.get("allow_m4a"))
+
+    if not isinstance(urls, list) or not urls or not all(isinstance(u, str) and u for u in urls):
+        return jsonify({"error": "A non-empty list of URLs is required."}), 400
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({"error": f"At most {MAX_BATCH_URLS} URLs can be downloaded per batch."}), 400
+
+    if data.get("stream"):
+        return Response(
+            _stream_batch(urls, format_type, media_type, allow_m4a),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    results = await download_batch(urls, format_type, media_type, allow_m4a)
+    return jsonify({"results": results})
+
+
 @app.route("/api/info", methods=["POST"])
 def info_video():
     """API endpoint to fetch metadata/preview for a URL without downloading."""
@@ -393,7 +823,7 @@ def info_video():
     if not url:
         return jsonify({"error": "URL is required."}), 400
     try:
-        result = extract_info_no_download(url)
+        result = get_video_info(url)
         print(f"Result: {result}")
         return jsonify(result)
     except Exception as e:
@@ -411,5 +841,5 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"Error listing download folder: {str(e)}")
     
-    # Run Flask with full logging
-    app.run(debug=True)
+    # Development server only; use gunicorn (see gunicorn.conf.py) in production
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
@@ -0,0 +1,15 @@
+# Production server settings, picked up automatically by: gunicorn app:app
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# Downloads are I/O-bound, so a few processes with many threads each serve
+# concurrent requests without a process per download.
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+# Each /api/download holds its thread until done, but only MAX_CONCURRENT_DOWNLOADS
+# (app.py) download at once; batches use a separate BATCH_CONCURRENCY pool
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+# A single /api/download request blocks until yt-dlp (and ffmpeg) finish
+timeout = 3600